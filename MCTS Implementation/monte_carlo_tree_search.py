@@ -1,23 +1,32 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import math
-from typing import Set, Optional
-from collections import namedtuple
-from random import choice
-import matplotlib.pyplot as plt
-import networkx as nx
+from multiprocessing import Pool
+import threading
+from typing import Iterable, Optional
 
-_TTTB = namedtuple("TicTacToeBoard", "tup turn winner terminal")
+# visits added to every node on a path while its simulation is in flight
+VIRTUAL_LOSS = 1
+
+# 1 / sqrt(n) for small visit counts, indexed by n
+INV_SQRT = [0.0] + [1.0 / math.sqrt(i) for i in range(1, 1024)]
+
+# sqrt(log(n)) for parent visit counts, indexed by n
+SQRT_LOG = [0.0] + [math.sqrt(math.log(i)) for i in range(1, 4096)]
 
 class MCTS:
     """Monte Carlo tree searcher. First rollout the tree then choose a move."""
 
-    def __init__(self, exploration_weight: float = 1):
-        self.Q: dict = defaultdict(int)  # total reward of each node
-        self.N: dict = defaultdict(int)  # total visit count for each node
+    def __init__(self, exploration_weight: float = 1, playouts_per_leaf: int = 1):
+        self.Q: dict = {}  # total reward of each node
+        self.N: dict = {}  # total visit count for each node
         self.children: dict = {}  # children of each node
+        self.unexpanded: dict = {}  # children of each node not yet expanded
+        self.nodes: dict = {}  # one shared instance per distinct node
         self.exploration_weight: float = exploration_weight
+        # random playouts run one after another from each selected leaf
+        self.playouts_per_leaf: int = playouts_per_leaf
 
     def choose(self, node: Node) -> Node:
         """Choose the best successor of node. (Choose a move in the game)"""
@@ -28,74 +37,194 @@ class MCTS:
             return node.find_random_child()
 
         def score(n: Node) -> float:
-            if self.N[n] == 0:
+            visits = self.N.get(n, 0)
+            if visits == 0:
                 return float("-inf")  # avoid unseen moves
-            return self.Q[n] / self.N[n]  # average reward
+            return self.Q[n] / visits  # average reward
+
+        # Ask the node itself for its moves: the stored children may belong to
+        # a different node that compares equal (e.g. a symmetric board).
+        return max(node.find_children(), key=score)
+
+    def do_rollouts(self, node: Node, rollouts: int, processes: int = 1) -> None:
+        """Run `rollouts` rollouts from `node`. With several processes, each
+        grows an independent tree from `node` and their statistics are summed
+        into this one (root parallelization)."""
+        if processes <= 1:
+            for _ in range(rollouts):
+                self.do_rollout(node)
+            return
+        share, extra = divmod(rollouts, processes)
+        jobs = [
+            (node, share + (i < extra), self.exploration_weight,
+             self.playouts_per_leaf)
+            for i in range(processes)
+        ]
+        with Pool(processes) as pool:
+            for tree in pool.map(_rollout_worker, jobs):
+                self.merge(tree)
+
+    def do_threaded_rollouts(self, node: Node, rollouts: int, threads: int) -> None:
+        """Run `rollouts` rollouts from `node` on several threads sharing this
+        tree. Each path carries a virtual loss while it is being simulated so
+        that concurrent selections spread over different nodes."""
+        lock = threading.Lock()
+        remaining = [rollouts]
+        k = self.playouts_per_leaf
+
+        def worker() -> None:
+            while True:
+                with lock:
+                    if not remaining[0]:
+                        return
+                    remaining[0] -= 1
+                    path = self._select(node)
+                    leaf = path[-1]
+                    self._expand(leaf)
+                    self._add_visits(path, VIRTUAL_LOSS)
+                reward = self._playouts(leaf)
+                with lock:
+                    self._add_visits(path, -VIRTUAL_LOSS)
+                    self._backpropagate(path, reward, k)
+
+        with ThreadPoolExecutor(threads) as pool:
+            workers = [pool.submit(worker) for _ in range(threads)]
+        for future in workers:
+            future.result()  # re-raise any exception from a worker
 
-        return max(self.children[node], key=score)
+    def merge(self, other: MCTS) -> None:
+        """Add the statistics and expanded nodes of `other` to this tree"""
+        Q, N = self.Q, self.N
+        for n, q in other.Q.items():
+            Q[n] = Q.get(n, 0) + q
+        for n, visits in other.N.items():
+            N[n] = N.get(n, 0) + visits
+        nodes = self.nodes
+        for n, children in other.children.items():
+            if n not in self.children:
+                self.children[n] = tuple(nodes.setdefault(c, c) for c in children)
+                self.unexpanded[n] = [nodes[c] for c in other.unexpanded[n]]
+
+    def prune(self, node: Node) -> None:
+        """Forget every node that is not reachable from `node`"""
+        keep = {node}
+        frontier = [node]
+        while frontier:
+            for child in self.children.get(frontier.pop(), ()):
+                if child not in keep:
+                    keep.add(child)
+                    frontier.append(child)
+        self.Q = {n: q for n, q in self.Q.items() if n in keep}
+        self.N = {n: v for n, v in self.N.items() if n in keep}
+        self.children = {n: c for n, c in self.children.items() if n in keep}
+        self.unexpanded = {n: u for n, u in self.unexpanded.items() if n in keep}
+        self.nodes = {n: m for n, m in self.nodes.items() if n in keep}
 
     def do_rollout(self, node: Node) -> None:
         """Make the tree one layer better. (Train for one iteration.)"""
         path = self._select(node)
         leaf = path[-1]
         self._expand(leaf)
-        reward = self._simulate(leaf)
-        self._backpropagate(path, reward)
+        self._backpropagate(path, self._playouts(leaf), self.playouts_per_leaf)
 
     def _select(self, node: Node) -> list[Node]:
         """Find an unexplored descendent of `node`"""
+        # start from the tree's own instance of the root so lookups along the
+        # path hit identical keys
+        node = self.nodes.setdefault(node, node)
         path = []
         while True:
             path.append(node)
-            if node not in self.children or not self.children[node]:
+            if not self.children.get(node):
                 # node is either unexplored or terminal
                 return path
-            unexplored = self.children[node] - self.children.keys()
-            if unexplored:
+            unexplored = self.unexpanded[node]
+            while unexplored:
                 n = unexplored.pop()
-                path.append(n)
-                return path
+                if n not in self.children:  # may be expanded via another parent
+                    path.append(n)
+                    return path
             node = self._uct_select(node)  # descend a layer deeper
 
     def _expand(self, node: Node) -> None:
         """Update the `children` dict with the children of `node`"""
         if node in self.children:
             return  # already expanded
-        self.children[node] = node.find_children()
+        nodes = self.nodes
+        children = tuple(nodes.setdefault(n, n) for n in node.find_children())
+        self.children[node] = children
+        self.unexpanded[node] = [n for n in children if n not in self.children]
 
     def _simulate(self, node: Node) -> float:
         """Returns the reward for a random simulation (to completion) of `node`"""
         invert_reward = True
-        while True:
-            if node.is_terminal():
-                reward = node.reward()
-                return 1 - reward if invert_reward else reward
-            next_node = node.find_random_child()
-            if next_node is None:
+        while not node.is_terminal():
+            node = node.find_random_child()
+            if node is None:
                 raise ValueError("find_random_child() returned None")
-            node = next_node
             invert_reward = not invert_reward
+        reward = node.reward()
+        return 1 - reward if invert_reward else reward
 
-    def _backpropagate(self, path: list[Node], reward: float) -> None:
-        """Send the reward back up to the ancestors of the leaf"""
+    def _playouts(self, node: Node) -> float:
+        """Returns the total reward of `playouts_per_leaf` random simulations
+        of `node`"""
+        k = self.playouts_per_leaf
+        if k == 1:
+            return self._simulate(node)
+        simulate = self._simulate
+        return sum(simulate(node) for _ in range(k))
+
+    def _backpropagate(
+        self, path: list[Node], reward: float, visits: int = 1
+    ) -> None:
+        """Send the total reward of `visits` simulations back up to the
+        ancestors of the leaf"""
+        N, Q = self.N, self.Q
         for node in reversed(path):
-            self.N[node] += 1
-            self.Q[node] += reward
-            reward = 1 - reward  # 1 for me is 0 for my enemy, and vice versa
+            N[node] = N.get(node, 0) + visits
+            Q[node] = Q.get(node, 0) + reward
+            # 1 for me is 0 for my enemy, and vice versa
+            reward = visits - reward
+
+    def _add_visits(self, path: list[Node], visits: int) -> None:
+        """Add visits without reward (i.e. losses) to every node on the path"""
+        N, Q = self.N, self.Q
+        for node in path:
+            N[node] = N.get(node, 0) + visits
+            Q[node] = Q.get(node, 0)  # keep Q defined wherever N is
 
     def _uct_select(self, node: Node) -> Node:
         """Select a child of node, balancing exploration & exploitation"""
-        assert all(n in self.children for n in self.children[node])
+        children = self.children[node]
+        assert all(n in self.children for n in children)
 
-        log_N_vertex = math.log(self.N[node])
+        # Upper confidence bound for trees, with the sqrt(log N(parent)) factor
+        # hoisted out of the loop: Q/N + c * sqrt(log N(parent)) / sqrt(N)
+        parent_visits = self.N[node]
+        if parent_visits < len(SQRT_LOG):
+            explore = self.exploration_weight * SQRT_LOG[parent_visits]
+        else:
+            explore = self.exploration_weight * math.sqrt(math.log(parent_visits))
+        best, best_uct = None, float("-inf")
+        for n in children:
+            visits = self.N[n]
+            if visits < len(INV_SQRT):
+                inv_sqrt = INV_SQRT[visits]
+            else:
+                inv_sqrt = 1.0 / math.sqrt(visits)
+            uct = self.Q[n] / visits + explore * inv_sqrt
+            if uct > best_uct:
+                best, best_uct = n, uct
+        return best
 
-        def uct(n: Node) -> float:
-            """Upper confidence bound for trees"""
-            return self.Q[n] / self.N[n] + self.exploration_weight * math.sqrt(
-                log_N_vertex / self.N[n]
-            )
 
-        return max(self.children[node], key=uct)
+def _rollout_worker(job: tuple) -> MCTS:
+    """Grow a fresh tree from a node in a worker process"""
+    node, rollouts, exploration_weight, playouts_per_leaf = job
+    tree = MCTS(exploration_weight, playouts_per_leaf)
+    tree.do_rollouts(node, rollouts)
+    return tree
 
 
 class Node(ABC):
@@ -105,10 +234,12 @@ class Node(ABC):
     Could be e.g. a chess or checkers board state.
     """
 
+    __slots__ = ()  # let slotted subclasses drop the per-instance __dict__
+
     @abstractmethod
-    def find_children(self) -> Set[Node]:
-        """All possible successors of this board state"""
-        return set()
+    def find_children(self) -> Iterable[Node]:
+        """All possible successors of this board state, without duplicates"""
+        return ()
 
     @abstractmethod
     def find_random_child(self) -> Optional[Node]:
@@ -0,0 +1,34 @@
+import time
+
+from monte_carlo_tree_search import MCTS
+from tictactoe import new_tic_tac_toe_board
+
+
+class SlowMCTS(MCTS):
+    """Holds each playout open so other threads select around it"""
+
+    def _simulate(self, node):
+        time.sleep(0.001)
+        return super()._simulate(node)
+
+
+def test_threaded_rollouts_complete_every_rollout():
+    board = new_tic_tac_toe_board()
+    for tree in (MCTS(), SlowMCTS()):
+        tree.do_threaded_rollouts(board, 400, threads=8)
+        assert tree.N[board] == 400
+        # every virtual loss was undone
+        assert sum(tree.N[n] for n in tree.children[board]) == 400 - 1
+
+
+def test_threaded_rollouts_reraise_worker_errors():
+    class BrokenMCTS(MCTS):
+        def _simulate(self, node):
+            raise ValueError("simulation failed")
+
+    try:
+        BrokenMCTS().do_threaded_rollouts(new_tic_tac_toe_board(), 10, threads=4)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("worker exception was swallowed")
@@ -0,0 +1,32 @@
+import random
+
+from monte_carlo_tree_search import MCTS
+from tictactoe import _MOVES, OPTIMAL_MOVE, new_tic_tac_toe_board
+
+
+def test_optimal_play_is_a_draw():
+    board = new_tic_tac_toe_board()
+    while not board.terminal:
+        board = OPTIMAL_MOVE[board.position]
+    assert board.winner is None
+
+
+def test_optimal_moves_are_legal():
+    for position, move in OPTIMAL_MOVE.items():
+        assert any(move is child for child in _MOVES[position])
+
+
+def test_mcts_never_loses_to_optimal_play():
+    random.seed(0)
+    for game in range(10):
+        mcts_turn = game % 2 == 0  # alternate playing X and O
+        tree = MCTS()
+        board = new_tic_tac_toe_board()
+        while not board.terminal:
+            if board.turn is mcts_turn:
+                tree.do_rollouts(board, 1000)
+                board = tree.choose(board)
+            else:
+                board = OPTIMAL_MOVE[board.position]
+            tree.prune(board)
+        assert board.winner in (None, mcts_turn)
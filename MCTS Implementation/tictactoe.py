@@ -1,25 +1,35 @@
-from collections import namedtuple
+from collections import deque
+from dataclasses import dataclass
 from random import choice
-import matplotlib.pyplot as plt
-import networkx as nx
 from monte_carlo_tree_search import MCTS, Node
 
-_TTTB = namedtuple("TicTacToeBoard", "tup turn winner terminal")
+_FULL = 0x1FF  # all nine cells occupied
+ROLLOUT_PROCESSES = 1  # worker processes for the computer's rollouts
+ENABLE_VIS = False  # draw the MCTS tree after every move
+USE_SOLVER = False  # play the precomputed optimal move instead of searching
 
+_CELL_CHARS = (" ", "X", "O")  # indexed by x_bit | o_bit << 1
+_PRETTY_BOARD = "\n  1 2 3\n1 {} {} {}\n2 {} {} {}\n3 {} {} {}\n"
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class TicTacToeBoard(Node):
+    """Board as two 9-bit bitboards; bit `i` is cell `3 * row + col`."""
+
+    xs: int
+    os: int
+    turn: bool
+    winner: bool | None
+    terminal: bool
+    key: int  # canonical packed board, shared by all symmetric variants
 
-class TicTacToeBoard(_TTTB, Node):
     def find_children(self):
-        if self.terminal:
-            return set()
-        return {
-            self.make_move(i) for i, value in enumerate(self.tup) if value is None
-        }
+        return _CHILDREN[self.position]
 
     def find_random_child(self):
         if self.terminal:
             return None
-        empty_spots = [i for i, value in enumerate(self.tup) if value is None]
-        return self.make_move(choice(empty_spots))
+        return choice(_MOVES[self.position])
 
     def reward(self):
         if not self.terminal:
@@ -35,124 +45,237 @@ class TicTacToeBoard(_TTTB, Node):
     def is_terminal(self):
         return self.terminal
 
+    @property
+    def position(self):
+        """Packed cells (xs | os << 9), unique per board unlike `key`"""
+        return self.xs | self.os << 9
+
+    def is_occupied(self, index):
+        return bool((self.xs | self.os) >> index & 1)
+
     def make_move(self, index):
-        tup = self.tup[:index] + (self.turn,) + self.tup[index + 1:]
-        turn = not self.turn
-        winner = _find_winner(tup)
-        is_terminal = (winner is not None) or not any(v is None for v in tup)
-        return TicTacToeBoard(tup, turn, winner, is_terminal)
+        xs, os = self.xs, self.os
+        if self.turn:
+            xs |= 1 << index
+        else:
+            os |= 1 << index
+        return _BOARDS[xs | os << 9]
 
     def to_pretty_string(self):
-        to_char = lambda v: ("X" if v is True else ("O" if v is False else " "))
-        rows = [
-            [to_char(self.tup[3 * row + col]) for col in range(3)] for row in range(3)
-        ]
-        return (
-                "\n  1 2 3\n"
-                + "\n".join(str(i + 1) + " " + " ".join(row) for i, row in enumerate(rows))
-                + "\n"
+        xs, os = self.xs, self.os
+        return _PRETTY_BOARD.format(
+            *(_CELL_CHARS[(xs >> i & 1) | (os >> i & 1) << 1] for i in range(9))
         )
 
+    def __hash__(self):
+        return self.key
 
-def _winning_combos():
-    for start in range(0, 9, 3):
-        yield (start, start + 1, start + 2)
-    for start in range(3):
-        yield (start, start + 3, start + 6)
-    yield (0, 4, 8)
-    yield (2, 4, 6)
+    def __eq__(self, other):
+        return isinstance(other, TicTacToeBoard) and self.key == other.key
 
 
-def _find_winner(tup):
-    for i1, i2, i3 in _winning_combos():
-        v1, v2, v3 = tup[i1], tup[i2], tup[i3]
-        if False is v1 is v2 is v3:
-            return False
-        if True is v1 is v2 is v3:
+def _make_board(xs, os, turn):
+    winner = _find_winner(xs, os)
+    is_terminal = (winner is not None) or (xs | os) == _FULL
+    return TicTacToeBoard(xs, os, turn, winner, is_terminal, _canonical(xs, os, turn))
+
+
+# The 8 symmetries of the board (rotations and reflections), each given as
+# the destination index of every cell.
+SYMS = tuple(
+    tuple(3 * r2 + c2 for r2, c2 in (f(i // 3, i % 3) for i in range(9)))
+    for f in (
+        lambda r, c: (r, c),
+        lambda r, c: (c, 2 - r),
+        lambda r, c: (2 - r, 2 - c),
+        lambda r, c: (2 - c, r),
+        lambda r, c: (r, 2 - c),
+        lambda r, c: (2 - r, c),
+        lambda r, c: (c, r),
+        lambda r, c: (2 - c, 2 - r),
+    )
+)
+
+# SYM_TABLE[s][bits] is the 9-bit mask `bits` transformed by symmetry `s`.
+SYM_TABLE = tuple(
+    tuple(
+        sum(1 << perm[i] for i in range(9) if bits >> i & 1) for bits in range(1 << 9)
+    )
+    for perm in SYMS
+)
+
+
+def _canonical(xs, os, turn):
+    """Packed key of the smallest symmetric variant, so equivalent boards
+    share statistics in the search tree."""
+    return min(table[xs] | table[os] << 9 for table in SYM_TABLE) | turn << 18
+
+
+# Rows, columns and diagonals as 9-bit masks over the cell indices.
+WIN_MASKS = (0o007, 0o070, 0o700, 0o111, 0o222, 0o444, 0o421, 0o124)
+
+
+def _find_winner(xs, os):
+    for mask in WIN_MASKS:
+        if xs & mask == mask:
             return True
+        if os & mask == mask:
+            return False
     return None
 
 
+def _build_transitions():
+    """Enumerate every reachable board once, returning the boards, each
+    board's successors, and its successors up to symmetry, all keyed by
+    position (xs | os << 9)."""
+    root = _make_board(0, 0, True)
+    boards = {0: root}
+    moves = {}
+    distinct = {}
+    frontier = [root]
+    while frontier:
+        board = frontier.pop()
+        children = []
+        if not board.terminal:
+            empty = ~(board.xs | board.os) & _FULL
+            while empty:
+                bit = empty & -empty
+                empty ^= bit
+                xs, os = board.xs, board.os
+                if board.turn:
+                    xs |= bit
+                else:
+                    os |= bit
+                position = xs | os << 9
+                if position not in boards:
+                    boards[position] = _make_board(xs, os, not board.turn)
+                    frontier.append(boards[position])
+                children.append(boards[position])
+        moves[board.position] = tuple(children)
+        # boards compare equal up to symmetry, so this drops mirrored moves
+        distinct[board.position] = tuple(dict.fromkeys(children))
+    return boards, moves, distinct
+
+
+_BOARDS, _MOVES, _CHILDREN = _build_transitions()
+
+
+def _solve():
+    """Minimax over every reachable board, from full boards back to the empty
+    one. Returns the best successor of each nonterminal board, keyed by
+    position."""
+    value = {}  # +1 if X wins with best play, -1 if O does, 0 for a draw
+    best = {}
+    for position in sorted(_BOARDS, key=lambda p: -p.bit_count()):
+        board = _BOARDS[position]
+        if board.terminal:
+            value[position] = 0 if board.winner is None else (1 if board.winner else -1)
+            continue
+        sign = 1 if board.turn else -1  # X maximizes, O minimizes
+        child = max(_MOVES[position], key=lambda c: sign * value[c.position])
+        value[position] = value[child.position]
+        best[position] = child
+    return best
+
+
+OPTIMAL_MOVE = _solve()
+
+
 def new_tic_tac_toe_board():
-    return TicTacToeBoard(tup=(None,) * 9, turn=True, winner=None, terminal=False)
+    return _BOARDS[0]
 
 
 def play_game():
-    tree = MCTS()
-    board = new_tic_tac_toe_board()
-    print(board.to_pretty_string())
-
     while True:
-        # Player's turn
+        tree = MCTS()
+        board = new_tic_tac_toe_board()
+        print(board.to_pretty_string())
+
         while True:
-            try:
-                row_col = input("Your turn! Enter row,col (e.g., 1,1): ")
-                row, col = map(int, row_col.split(","))
-                index = 3 * (row - 1) + (col - 1)
-                if board.tup[index] is not None:
-                    print("Invalid move! That spot is already taken.")
-                    continue
+            # Player's turn
+            while True:
+                try:
+                    row_col = input("Your turn! Enter row,col (e.g., 1,1): ")
+                    row, col = map(int, row_col.split(","))
+                    index = 3 * (row - 1) + (col - 1)
+                    if board.is_occupied(index):
+                        print("Invalid move! That spot is already taken.")
+                        continue
+                    break
+                except ValueError:
+                    print("Invalid input! Please enter row,col (e.g., 1,1).")
+
+            board = board.make_move(index)
+            tree.prune(board)
+            print(board.to_pretty_string())
+            if ENABLE_VIS:  # Visualize MCTS tree after player's move
+                visualize_mcts_tree(tree, board)
+            if board.terminal:
                 break
-            except ValueError:
-                print("Invalid input! Please enter row,col (e.g., 1,1).")
 
-        board = board.make_move(index)
-        print(board.to_pretty_string())
-        visualize_mcts_tree(tree, board)  # Visualize MCTS tree after player's move
-        if board.terminal:
-            break
+            # Computer's turn
+            print("Computer's turn...")
+            if USE_SOLVER:
+                board = OPTIMAL_MOVE[board.position]
+            else:
+                tree.do_rollouts(board, 50, processes=ROLLOUT_PROCESSES)
+                board = tree.choose(board)
+            tree.prune(board)
+            print(board.to_pretty_string())
+            if ENABLE_VIS:  # Visualize MCTS tree after computer's move
+                visualize_mcts_tree(tree, board)
 
-        # Computer's turn
-        print("Computer's turn...")
-        for _ in range(50):
-            tree.do_rollout(board)
-        board = tree.choose(board)
-        print(board.to_pretty_string())
-        visualize_mcts_tree(tree, board)  # Visualize MCTS tree after computer's move
+            if board.terminal:
+                break
 
-        if board.terminal:
+        # Game ended, display result
+        if board.winner is True:
+            print("Congratulations! You won!")
+        elif board.winner is False:
+            print("Sorry, you lost. Better luck next time!")
+        else:
+            print("It's a draw!")
+
+        # Ask if the player wants to play again
+        play_again = input("Do you want to play again? (yes/no): ").lower()
+        if play_again != "yes":
+            print("Thanks for playing!")
             break
 
-    # Game ended, display result
-    if board.winner is True:
-        print("Congratulations! You won!")
-    elif board.winner is False:
-        print("Sorry, you lost. Better luck next time!")
-    else:
-        print("It's a draw!")
 
-    # Ask if the player wants to play again
-    play_again = input("Do you want to play again? (yes/no): ").lower()
-    if play_again == "yes":
-        play_game()
-    else:
-        print("Thanks for playing!")
+# Node positions from the previous drawing, reused as the next layout's start
+_last_pos = {}
 
 
 def visualize_mcts_tree(tree, root_node):
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
     G = nx.DiGraph()
     node_labels = {}
 
-    def add_nodes(node):
-        if node not in node_labels:
-            node_labels[node] = f"Q: {tree.Q[node]}, N: {tree.N[node]}"
-            G.add_node(node_labels[node])
-            for child in tree.children.get(node, []):
-                child_label = node_labels.get(child, None)
-                if child_label is None:
-                    child_label = f"Q: {tree.Q[child]}, N: {tree.N[child]}"
-                    node_labels[child] = child_label
-                    G.add_node(child_label)
-                G.add_edge(node_labels[node], child_label)
-                add_nodes(child)
-
-    add_nodes(root_node)
-
-    pos = nx.spring_layout(G)
-
-    plt.figure(figsize=(10, 10))
-    nx.draw(G, pos, with_labels=True, arrows=True)
-    plt.show()
+    queue = deque([root_node])
+    while queue:
+        node = queue.popleft()
+        if node in node_labels:
+            continue
+        node_labels[node] = f"Q: {tree.Q.get(node, 0)}, N: {tree.N.get(node, 0)}"
+        G.add_node(node)
+        for child in tree.children.get(node, ()):
+            G.add_edge(node, child)
+            queue.append(child)
+
+    # Nodes drawn before start where they were, so a few iterations suffice
+    initial = {node: _last_pos[node] for node in G if node in _last_pos}
+    pos = nx.spring_layout(G, pos=initial or None, iterations=5 if initial else 50)
+    _last_pos.clear()
+    _last_pos.update(pos)
+
+    plt.figure("MCTS tree", figsize=(10, 10))  # reuse one window across moves
+    plt.clf()
+    nx.draw(G, pos, labels=node_labels, arrows=True)
+    plt.draw()
+    plt.pause(0.01)
 
 
 if __name__ == "__main__":